@@ -1,5 +1,5 @@
 from pathlib import Path
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
@@ -7,11 +7,41 @@ import uvicorn
 from collections import defaultdict
 import logging
 import json
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Connection limits, overridable via environment for the deployment
+MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", "2000"))
+# Commands are short names; anything bigger is rejected. Keep uvicorn's --ws-max-size
+# (Procfile, railway.toml) at this value so oversized frames are never buffered at all.
+MAX_MESSAGE_BYTES = 1024
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", "20"))  # seconds of silence before a ping
+IDLE_TIMEOUT = float(os.environ.get("IDLE_TIMEOUT", "60"))  # seconds of silence before a connection is reaped
+SEND_TIMEOUT = 5.0  # seconds a single send may take before the connection is treated as dead
+OUTBOX_SIZE = 64  # Messages queued per connection before the oldest is dropped
+# Inbound memory per connection is bounded by uvicorn's --ws-max-size (MAX_MESSAGE_BYTES)
+# times --ws-max-queue (WS_MAX_QUEUE frames); keep the Procfile and railway.toml in sync.
+WS_MAX_QUEUE = 4
+
+# Heartbeat protocol: the server sends PING_MESSAGE, clients reply with PONG_TEXT.
+# Any message from a client counts as proof of life. uvicorn's protocol-level pings
+# (--ws-ping-interval) also run, but their pongs are consumed inside uvicorn and never
+# reach the app, so they can't feed last_seen, the reaper or /stats.
+PING_MESSAGE = json.dumps({"type": "ping"})
+PONG_TEXT = "__pong__"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reaper = asyncio.create_task(reap_connections())
+    yield
+    reaper.cancel()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS: if you don't use cookies/auth, keep credentials False and wildcard origins OK
 app.add_middleware(
@@ -48,37 +78,135 @@ async def get_websocket_test():
         raise HTTPException(status_code=404, detail="websocket_test.html not found")
     return page.read_text(encoding="utf-8")
 
-connections = set()
+class ConnectionInfo:
+    """Liveness, traffic accounting and the outbound queue for one websocket connection"""
+
+    def __init__(self):
+        now = time.monotonic()
+        self.connected_at = now
+        self.last_seen = now
+        self.last_ping = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.dropped = 0
+        # Bounded so a slow client costs at most OUTBOX_SIZE messages of memory
+        self.outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self.writer = None
+
+    def enqueue(self, message: str):
+        """Queue a message without waiting, dropping the oldest one if the client is behind"""
+        if self.outbox.full():
+            self.outbox.get_nowait()
+            self.dropped += 1
+        self.outbox.put_nowait(message)
+
+
+# websocket -> ConnectionInfo
+connections = {}
+
+
+def admission_error():
+    """Return a reason to refuse a new connection, or None if it can be admitted"""
+    if len(connections) >= MAX_CONNECTIONS:
+        return "Server at capacity"
+    return None
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "connections": len(connections),
+        "max_connections": MAX_CONNECTIONS,
+        "queued_messages": sum(info.outbox.qsize() for info in connections.values()),
+        "dropped_messages": sum(info.dropped for info in connections.values()),
+        "bytes_in": sum(info.bytes_in for info in connections.values()),
+        "bytes_out": sum(info.bytes_out for info in connections.values()),
+    }
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     logger.info("WebSocket connection attempt")
+    reason = admission_error()
+    if reason:
+        # Refuse before accepting: the handshake fails (HTTP 403) without costing a full
+        # connection, and the client's reconnect backoff keeps growing instead of resetting
+        logger.warning(f"Rejecting WebSocket connection: {reason} ({len(connections)} open)")
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=reason)
+        return
     await websocket.accept()
     logger.info("WebSocket connection accepted")
-    connections.add(websocket)
+    info = ConnectionInfo()
+    info.writer = asyncio.create_task(write_loop(websocket, info))
+    connections[websocket] = info
     try:
         while True:
             data = await websocket.receive_text()
+            size = len(data.encode("utf-8"))
+            info.last_seen = time.monotonic()
+            info.bytes_in += size
+            if data == PONG_TEXT:
+                continue
+            if size > MAX_MESSAGE_BYTES:
+                logger.warning(f"Closing connection after oversized message ({size} bytes)")
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                break
             logger.info(f"Received command: {data}")
-            await broadcast(json.dumps({"command": data}))
+            broadcast(json.dumps({"command": data}))
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        connections.discard(websocket)
+        connections.pop(websocket, None)
+        info.writer.cancel()
 
-async def broadcast(message: str):
+async def write_loop(ws: WebSocket, info: ConnectionInfo):
+    """Drain a connection's outbox so slow clients never hold up anyone's receive loop"""
+    try:
+        while True:
+            message = await info.outbox.get()
+            await asyncio.wait_for(ws.send_text(message), SEND_TIMEOUT)
+            info.bytes_out += len(message.encode("utf-8"))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error sending to client: {e!r}")
+        # Close the socket (a timed-out send may have left a partial frame) so its
+        # receive loop ends instead of lingering outside the cap and the reaper
+        connections.pop(ws, None)
+        await close_quietly(ws)
+
+def broadcast(message: str):
+    """Queue a message for every connection; delivery happens in each write_loop"""
     logger.info(f"Broadcasting: {message}")
-    dead = []
-    for ws in connections:
-        try:
-            await ws.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending to client: {e}")
-            dead.append(ws)
-    for ws in dead:
-        connections.discard(ws)
+    for info in connections.values():
+        info.enqueue(message)
+
+async def reap_connections():
+    """Ping quiet connections and drop the ones that stay silent past IDLE_TIMEOUT"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL / 2)
+        now = time.monotonic()
+        reaped = []
+        for ws, info in list(connections.items()):
+            idle = now - info.last_seen
+            if idle > IDLE_TIMEOUT:
+                logger.info(f"Reaping idle WebSocket connection (silent for {idle:.0f}s)")
+                connections.pop(ws, None)
+                reaped.append(close_quietly(ws))
+            elif idle > HEARTBEAT_INTERVAL and now - info.last_ping > HEARTBEAT_INTERVAL:
+                info.last_ping = now
+                info.enqueue(PING_MESSAGE)
+        if reaped:
+            await asyncio.gather(*reaped)
+
+async def close_quietly(ws: WebSocket):
+    try:
+        await asyncio.wait_for(ws.close(code=status.WS_1001_GOING_AWAY), SEND_TIMEOUT)
+    except Exception:
+        pass
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
+    uvicorn.run(app, host="0.0.0.0", port=8080, ws_max_size=MAX_MESSAGE_BYTES, ws_max_queue=WS_MAX_QUEUE,
+                ws_ping_interval=HEARTBEAT_INTERVAL, ws_ping_timeout=HEARTBEAT_INTERVAL)
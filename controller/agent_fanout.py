@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import time
+import aiohttp
+
+logger = logging.getLogger('AgentFanout')
+
+# Configuration
+AGENT_TIMEOUT = 2.0  # seconds to wait for an agent to acknowledge a decision
+AGENT_POOL_SIZE = 4  # Keep-alive connections held open per agent
+AGENT_MAX_IN_FLIGHT = 2  # Skip an agent that already has this many unacknowledged decisions
+LATENCY_SMOOTHING = 0.2  # Weight of the newest sample in the moving average
+
+
+class AgentStats:
+    """Latency and delivery counters for one remote controller agent"""
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.acked = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.last_rtt_ms = None
+        self.avg_rtt_ms = None
+        self.last_execution_ms = None
+
+    def record_ack(self, rtt_ms, execution_ms):
+        self.acked += 1
+        self.last_rtt_ms = rtt_ms
+        self.last_execution_ms = execution_ms
+        if self.avg_rtt_ms is None:
+            self.avg_rtt_ms = rtt_ms
+        else:
+            self.avg_rtt_ms += LATENCY_SMOOTHING * (rtt_ms - self.avg_rtt_ms)
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'in_flight': self.in_flight,
+            'acked': self.acked,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+            'last_rtt_ms': self.last_rtt_ms,
+            'avg_rtt_ms': self.avg_rtt_ms,
+            'last_execution_ms': self.last_execution_ms
+        }
+
+
+class AgentFanout:
+    """
+    Publishes window decisions to remote ControllerAgents.
+
+    Every agent gets its own request over a shared pooled session, so a slow
+    or unreachable host only ever delays itself. An agent still executing an
+    earlier decision refuses new ones, so a timed-out host never builds a backlog.
+    """
+
+    def __init__(self, urls, token):
+        self.agents = [AgentStats(url.rstrip('/')) for url in urls]
+        self.token = token
+        self.session = None
+        self.tasks = set()
+
+    def __len__(self):
+        return len(self.agents)
+
+    async def start(self):
+        """Open the pooled HTTP session (call from inside the event loop)"""
+        if not self.agents:
+            return
+        if not self.token:
+            logger.warning("CONTROLLER_AGENT_TOKEN is not set; agents will reject every decision")
+        connector = aiohttp.TCPConnector(limit_per_host=AGENT_POOL_SIZE)
+        timeout = aiohttp.ClientTimeout(total=AGENT_TIMEOUT)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                             headers={'X-Agent-Token': self.token})
+        logger.info(f"Publishing decisions to {len(self.agents)} controller agent(s): "
+                    f"{', '.join(agent.url for agent in self.agents)}")
+
+    def dispatch(self, command, decision_id):
+        """Send a decision to every agent concurrently without waiting for acknowledgements"""
+        if self.session is None:
+            return
+        payload = {'decision_id': decision_id, 'command': command}
+        for agent in self.agents:
+            if agent.in_flight >= AGENT_MAX_IN_FLIGHT:
+                agent.skipped += 1
+                logger.warning(f"Agent {agent.url} still busy, skipping decision {decision_id}")
+                continue
+            task = asyncio.create_task(self._send(agent, payload))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _send(self, agent, payload):
+        agent.in_flight += 1
+        start = time.perf_counter()
+        try:
+            async with self.session.post(f"{agent.url}/execute", json=payload) as response:
+                result = await response.json()
+            rtt_ms = (time.perf_counter() - start) * 1000
+            if result.get('busy'):
+                agent.skipped += 1
+                logger.warning(f"Agent {agent.url} busy, skipped decision {payload['decision_id']}")
+                return
+            if response.status != 200 or not result.get('ok'):
+                agent.failed += 1
+                logger.error(f"Agent {agent.url} rejected decision {payload['decision_id']}: "
+                             f"{result.get('error')}")
+                return
+            agent.record_ack(rtt_ms, result.get('execution_ms'))
+            logger.debug(f"Agent {agent.url} acknowledged decision {payload['decision_id']} "
+                         f"in {rtt_ms:.0f}ms (execution {result.get('execution_ms', 0):.0f}ms)")
+        except asyncio.TimeoutError:
+            agent.timeouts += 1
+            logger.warning(f"Agent {agent.url} timed out on decision {payload['decision_id']}")
+        except Exception as e:
+            agent.failed += 1
+            logger.error(f"Error sending decision to agent {agent.url}: {str(e)}")
+        finally:
+            agent.in_flight -= 1
+
+    def stats(self):
+        return [agent.to_dict() for agent in self.agents]
+
+    async def close(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+
+# Import directly from the current directory
+from controller import Controller
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('ControllerAgent')
+
+# Configuration
+AGENT_PORT = 8090  # Port the aggregator sends decisions to
+AGENT_HOST = os.environ.get('CONTROLLER_AGENT_HOST', '0.0.0.0')  # Interface to listen on
+# Shared secret the aggregator must send in the X-Agent-Token header
+AGENT_TOKEN = os.environ.get('CONTROLLER_AGENT_TOKEN', '')
+
+
+class ControllerAgent:
+    """
+    Runs a Controller on a game host and executes decisions sent by a CrowdAggregator.
+
+    Decisions arrive as POST /execute with a JSON body {"decision_id", "command"}
+    and are acknowledged with how long they waited and how long they took to run.
+    Only one decision is held at a time: new ones are refused while busy, so
+    nothing queues up behind a slow execution.
+    """
+
+    def __init__(self, token):
+        self.token = token
+
+        # Use the default Controller settings
+        self.controller = Controller()
+
+        # One worker so key presses from consecutive decisions never overlap
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.busy = False
+        self.executed = 0
+
+    async def handle_execute(self, request):
+        """Execute one decision and acknowledge it with timing information"""
+        received = time.perf_counter()
+        if not hmac.compare_digest(request.headers.get('X-Agent-Token', ''), self.token):
+            return web.json_response({'ok': False, 'error': "Invalid agent token"}, status=401)
+        try:
+            data = await request.json()
+            command = data['command']
+        except Exception as e:
+            return web.json_response({'ok': False, 'error': f"Bad request: {str(e)}"}, status=400)
+
+        decision_id = data.get('decision_id')
+        if self.busy:
+            logger.warning(f"Busy, refusing decision {decision_id}: {command}")
+            return web.json_response({'ok': False, 'decision_id': decision_id, 'busy': True,
+                                      'error': "Agent busy"}, status=409)
+
+        started = None
+
+        def run():
+            nonlocal started
+            started = time.perf_counter()
+            self.controller.execute(command)
+            return time.perf_counter()
+
+        self.busy = True
+        try:
+            finished = await asyncio.get_running_loop().run_in_executor(self.executor, run)
+        except Exception as e:
+            logger.error(f"Error executing command {command}: {str(e)}")
+            return web.json_response({'ok': False, 'decision_id': decision_id, 'error': str(e)}, status=500)
+        finally:
+            self.busy = False
+
+        self.executed += 1
+        logger.info(f"Executed decision {decision_id}: {command}")
+        return web.json_response({
+            'ok': True,
+            'decision_id': decision_id,
+            'command': command,
+            'queued_ms': (started - received) * 1000,
+            'execution_ms': (finished - started) * 1000
+        })
+
+    async def handle_health(self, request):
+        return web.json_response({'ok': True, 'executed': self.executed})
+
+    def setup_web_app(self):
+        app = web.Application()
+        app.router.add_post('/execute', self.handle_execute)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+
+def main():
+    print("\n" + "=" * 70)
+    print(f"ControllerAgent - executing crowd decisions on this machine")
+    print(f"Listening on {AGENT_HOST}:{AGENT_PORT}")
+    print("=" * 70 + "\n")
+
+    # Anyone who can reach /execute can press keys on this machine
+    if not AGENT_TOKEN:
+        print("Error: set CONTROLLER_AGENT_TOKEN to the shared secret configured on the aggregator")
+        sys.exit(1)
+
+    agent = ControllerAgent(AGENT_TOKEN)
+    web.run_app(agent.setup_web_app(), host=AGENT_HOST, port=AGENT_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,13 @@ import os
 import sys
 import signal
 import aiohttp
+from concurrent.futures import ThreadPoolExecutor
 from aiohttp import web
 
 # Import directly from the current directory
 from controller import Controller, Action
+from agent_fanout import AgentFanout
+from viewer_fanout import ViewerFanout, SSE_KEEPALIVE_INTERVAL, SNAPSHOT_MAX_AGE, VIEWER_SEND_TIMEOUT
 
 # Set up logging
 logging.basicConfig(
@@ -26,6 +29,11 @@ logger = logging.getLogger('CrowdAggregator')
 WEBSOCKET_URI = "wss://uvicorn-backendmain-production.up.railway.app/ws"
 AGGREGATION_WINDOW = 1  # seconds
 WEB_PORT = 8080  # Port for visualization web server
+HEARTBEAT_REPLY = "__pong__"  # Reply to the backend's {"type": "ping"} heartbeats
+# Remote controller agents (comma-separated URLs, e.g. "http://192.168.1.20:8090") that
+# execute each decision alongside the local controller
+CONTROLLER_AGENTS = [url.strip() for url in os.environ.get('CONTROLLER_AGENTS', '').split(',') if url.strip()]
+CONTROLLER_AGENT_TOKEN = os.environ.get('CONTROLLER_AGENT_TOKEN', '')  # Shared secret the agents require
 
 # Path to the HTML template file (relative to this script)
 HTML_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'visualizer.html')
@@ -42,13 +50,20 @@ class CrowdAggregator:
         # Use the default Controller settings
         self.controller = Controller()
         
+        # One worker so local key presses run off the event loop without overlapping
+        self.controller_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # Remote hosts that receive every decision as well
+        self.agents = AgentFanout(CONTROLLER_AGENTS, CONTROLLER_AGENT_TOKEN)
+        self.decision_count = 0
+        
         # Flags for controlled shutdown
         self.running = True
         self.websocket_connected = False
         
         # For the visualization
         self.web_app = None
-        self.visualization_clients = set()
+        self.viewers = ViewerFanout()
         
         # Register signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self.handle_signal)
@@ -71,10 +86,8 @@ class CrowdAggregator:
         logger.debug(f"Recorded command: {command}")
         
         # Send this individual command to all visualization clients
-        asyncio.create_task(self.broadcast_command(command))
-        
-        # Also broadcast the updated state
-        asyncio.create_task(self.broadcast_state())
+        # (the updated state goes out on the next aggregation_timer tick)
+        self.broadcast_command(command)
             
     def execute_top_command(self):
         """Execute the most common command in the current window"""
@@ -87,9 +100,16 @@ class CrowdAggregator:
         total = sum(self.command_counter.values())
         
         try:
-            # Execute the command directly - let the controller handle conversion
+            # Publish to remote agents; their requests go out while the local controller runs
+            self.decision_count += 1
+            self.agents.dispatch(top_command, self.decision_count)
+            
+            # Execute the command on the controller thread - let the controller handle conversion.
+            # The key presses block, so keeping them off the event loop lets the agent sends proceed.
             logger.info(f"Executing top command: {top_command} (count: {count}, {count/total:.1%} of votes)")
-            self.controller.execute(top_command)
+            execution = asyncio.get_running_loop().run_in_executor(
+                self.controller_executor, self.controller.execute, top_command)
+            execution.add_done_callback(self.log_execution_error)
             
             # Create command record
             command_record = {
@@ -112,13 +132,18 @@ class CrowdAggregator:
             print("-" * 60)
             
             # Broadcast updated state including the executed command
-            asyncio.create_task(self.broadcast_state())    
+            self.broadcast_state()
                 
             return top_command
         except Exception as e:
             logger.error(f"Error executing command {top_command}: {str(e)}")
             return None
             
+    def log_execution_error(self, future):
+        """Report errors from a local controller execution running in the background"""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Error executing command: {str(future.exception())}")
+            
     def reset_window(self):
         """Reset the aggregation window"""
         self.command_counter.clear()
@@ -128,7 +153,7 @@ class CrowdAggregator:
         logger.info("Reset aggregation window")
         
         # Broadcast the reset to all visualization clients
-        asyncio.create_task(self.broadcast_state())
+        self.broadcast_state()
         
     async def websocket_client(self):
         """Connect to the WebSocket server and process incoming commands"""
@@ -150,8 +175,11 @@ class CrowdAggregator:
                             try:
                                 data = json.loads(message)
                                 
+                                # Answer server heartbeats so the backend doesn't reap us as idle
+                                if data.get('type') == 'ping':
+                                    await websocket.send(HEARTBEAT_REPLY)
                                 # Extract the command from the message
-                                if 'command' in data:
+                                elif 'command' in data:
                                     command = data['command']
                                     print(f"\rReceived: {command}", end="")
                                     self.record_command(command)
@@ -195,8 +223,8 @@ class CrowdAggregator:
                 sys.stdout.flush()
 
             # Broadcast state every loop iteration (10x per second) for smooth visualization
-            if self.visualization_clients:
-                await self.broadcast_state()
+            # This also refreshes the cached snapshot served over HTTP
+            self.broadcast_state()
             
             # Check if the window has elapsed
             if elapsed >= AGGREGATION_WINDOW:
@@ -212,9 +240,9 @@ class CrowdAggregator:
             # Short sleep to prevent CPU spinning
             await asyncio.sleep(0.1)
     
-    async def broadcast_command(self, command):
+    def broadcast_command(self, command):
         """Broadcast a single command to all visualization clients"""
-        if not self.visualization_clients:
+        if not self.viewers:
             return
             
         # Prepare command data
@@ -224,29 +252,11 @@ class CrowdAggregator:
             'timestamp': datetime.now().isoformat()
         }
         
-        # Convert to JSON
-        message = json.dumps(data)
-        
-        # Clients to remove
-        to_remove = set()
-        
-        # Send to all clients
-        for ws in self.visualization_clients:
-            try:
-                await ws.send_str(message)
-            except Exception as e:
-                logger.error(f"Error sending command to visualization client: {str(e)}")
-                to_remove.add(ws)
-                
-        # Remove closed connections
-        for ws in to_remove:
-            self.visualization_clients.remove(ws)
+        # Serialized once and queued for every viewer without waiting on sends
+        self.viewers.publish_command(data)
     
-    async def broadcast_state(self):
+    def broadcast_state(self):
         """Broadcast the current state to all visualization clients"""
-        if not self.visualization_clients:
-            return
-            
         # Calculate time remaining
         current_time = time.time()
         elapsed = current_time - self.window_start_time
@@ -263,51 +273,84 @@ class CrowdAggregator:
             'aggregation_window': AGGREGATION_WINDOW
         }
         
-        # Convert to JSON
-        message = json.dumps(state)
-        
-        # Clients to remove
-        to_remove = set()
-        
-        # Send to all clients
-        for ws in self.visualization_clients:
-            try:
-                await ws.send_str(message)
-            except Exception as e:
-                logger.error(f"Error sending to visualization client: {str(e)}")
-                to_remove.add(ws)
-                
-        # Remove closed connections
-        for ws in to_remove:
-            self.visualization_clients.remove(ws)
+        # Serialized once and queued for every viewer without waiting on sends
+        return self.viewers.publish_state(state)
     
     async def handle_visualization_ws(self, request):
         """Handle WebSocket connections for visualization"""
         ws = web.WebSocketResponse()
         await ws.prepare(request)
         
-        # Add to clients
-        self.visualization_clients.add(ws)
-        logger.info(f"New visualization client connected, total: {len(self.visualization_clients)}")
-        
-        # Send initial state
-        await self.broadcast_state()
+        # Add to viewers; the latest state is queued for it immediately
+        viewer = self.viewers.add(ws.send_str, lambda frame: frame.text)
+        logger.info(f"New visualization client connected, total: {len(self.viewers)}")
         
+        # We don't expect messages from the client, but we need to keep reading
+        # to maintain the connection
+        receiving = asyncio.create_task(self.drain_visualization_ws(ws))
+        try:
+            # Stop when the client leaves or the drop policy disconnects the viewer
+            await asyncio.wait({receiving, viewer.task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            receiving.cancel()
+            # Remove from viewers and close the socket so the overlay reconnects
+            self.viewers.remove(viewer)
+            if not ws.closed:
+                await ws.close()
+            logger.info(f"Visualization client disconnected, remaining: {len(self.viewers)}")
+            
+        return ws
+    
+    async def drain_visualization_ws(self, ws):
+        """Read (and ignore) messages until the visualization client disconnects"""
         try:
-            # Keep connection open
             async for msg in ws:
-                # We don't expect messages from the client, but we need to keep the loop
-                # to maintain the connection
                 pass
         except Exception as e:
             logger.error(f"Visualization WebSocket error: {str(e)}")
+    
+    async def handle_events(self, request):
+        """Stream state and command events to clients that can't use WebSockets (SSE)"""
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+        
+        viewer = self.viewers.add(response.write, lambda frame: frame.sse)
+        logger.info(f"New SSE client connected, total: {len(self.viewers)}")
+        
+        try:
+            # Send a comment periodically so proxies keep the stream open
+            # and disconnected clients are noticed
+            while not viewer.task.done():
+                done, _ = await asyncio.wait({viewer.task}, timeout=SSE_KEEPALIVE_INTERVAL)
+                if not done:
+                    await asyncio.wait_for(response.write(b": keepalive\n\n"), VIEWER_SEND_TIMEOUT)
+        except (ConnectionResetError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.error(f"SSE stream error: {str(e)}")
         finally:
-            # Remove from clients
-            if ws in self.visualization_clients:
-                self.visualization_clients.remove(ws)
-            logger.info(f"Visualization client disconnected, remaining: {len(self.visualization_clients)}")
+            self.viewers.remove(viewer)
+            logger.info(f"SSE client disconnected, remaining: {len(self.viewers)}")
             
-        return ws
+        return response
+    
+    async def handle_snapshot(self, request):
+        """Serve the latest state as JSON for clients that only poll"""
+        # No ETag: 'remaining' changes every tick, so a short max-age is what lets caches help
+        frame = self.viewers.latest_state or self.broadcast_state()
+        headers = {'Cache-Control': f'public, max-age={SNAPSHOT_MAX_AGE}'}
+        return web.Response(text=frame.text, content_type='application/json', headers=headers)
+    
+    async def handle_agents(self, request):
+        """Serve controller agent stats to the local machine only (they include LAN addresses)"""
+        if request.remote not in ('127.0.0.1', '::1'):
+            return web.Response(text="Forbidden", status=403)
+        return web.json_response(self.agents.stats())
     
     async def handle_index(self, request):
         """Serve the visualization HTML page"""
@@ -324,6 +367,9 @@ class CrowdAggregator:
         app = web.Application()
         app.router.add_get('/', self.handle_index)
         app.router.add_get('/visualize', self.handle_visualization_ws)
+        app.router.add_get('/events', self.handle_events)
+        app.router.add_get('/state', self.handle_snapshot)
+        app.router.add_get('/agents', self.handle_agents)
         self.web_app = app
             
     async def run(self):
@@ -331,6 +377,9 @@ class CrowdAggregator:
         # Set up the web app
         self.setup_web_app()
         
+        # Open pooled connections to any remote controller agents
+        await self.agents.start()
+        
         # Start the web server
         runner = web.AppRunner(self.web_app)
         await runner.setup()
@@ -349,6 +398,9 @@ class CrowdAggregator:
             logger.info("Tasks cancelled")
         finally:
             # Clean up
+            self.viewers.close_all()
+            await self.agents.close()
+            self.controller_executor.shutdown(wait=False)
             await runner.cleanup()
 
 def main():
@@ -357,6 +409,8 @@ def main():
     print(f"Connecting to {WEBSOCKET_URI}")
     print(f"Aggregation window: {AGGREGATION_WINDOW} seconds")
     print(f"Visualization server at http://localhost:{WEB_PORT}")
+    if CONTROLLER_AGENTS:
+        print(f"Controller agents: {', '.join(CONTROLLER_AGENTS)}")
     print("=" * 70 + "\n")
     
     # Create the aggregator
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+from collections import deque
+
+logger = logging.getLogger('ViewerFanout')
+
+# Configuration
+VIEWER_COMMAND_BUFFER = 32  # Max queued command frames per viewer before dropping the oldest
+VIEWER_SEND_TIMEOUT = 2.0  # seconds a single send may take before the viewer is dropped
+VIEWER_MAX_DROPS = 200  # Disconnect a viewer after this many command frames dropped without catching up
+SSE_KEEPALIVE_INTERVAL = 15  # seconds between SSE comment keepalives
+SNAPSHOT_MAX_AGE = 1  # seconds HTTP caches may reuse a state snapshot
+
+
+class Frame:
+    """A message serialized once and shared by every viewer"""
+
+    def __init__(self, kind, data):
+        self.kind = kind
+        self.text = json.dumps(data)
+        self._sse = None
+
+    @property
+    def sse(self):
+        """The frame encoded as a Server-Sent Event (built lazily, then reused)"""
+        if self._sse is None:
+            self._sse = f"event: {self.kind}\ndata: {self.text}\n\n".encode('utf-8')
+        return self._sse
+
+
+class Viewer:
+    """
+    One read-only subscriber with its own sender task.
+
+    State frames are coalesced so a slow viewer only ever sees the latest state,
+    and a pending state is always sent ahead of queued commands; command frames are queued in a bounded buffer that drops the oldest
+    entry when full. Publishing never awaits the network. A viewer is only cut
+    off for dropping too many frames in a row; catching up resets the count.
+    """
+
+    def __init__(self, send, encode, name):
+        self.send = send
+        self.encode = encode
+        self.name = name
+        self.pending_state = None
+        self.commands = deque(maxlen=VIEWER_COMMAND_BUFFER)
+        self.dropped = 0  # Command frames dropped since the viewer last caught up
+        self.closed = False
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def offer(self, frame):
+        """Queue a frame for delivery, applying the drop policy"""
+        if self.closed:
+            return
+        if frame.kind == 'state':
+            # Newer state supersedes an undelivered one; this is not a drop
+            self.pending_state = frame
+        else:
+            if len(self.commands) == self.commands.maxlen:
+                self.dropped += 1
+            self.commands.append(frame)
+        if self.dropped > VIEWER_MAX_DROPS:
+            logger.warning(f"Viewer {self.name} dropped {self.dropped} frames, disconnecting")
+            self.close()
+            return
+        self.wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+    async def run(self):
+        """Deliver queued frames until the viewer is closed or a send fails"""
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+
+                while (self.commands or self.pending_state is not None) and not self.closed:
+                    # The tally goes out first so it never waits behind command bubbles
+                    if self.pending_state is not None:
+                        frame, self.pending_state = self.pending_state, None
+                    else:
+                        frame = self.commands.popleft()
+                    await asyncio.wait_for(self.send(self.encode(frame)), VIEWER_SEND_TIMEOUT)
+
+                # Queue drained: the viewer has caught up
+                self.dropped = 0
+        except asyncio.TimeoutError:
+            logger.warning(f"Viewer {self.name} send timed out, disconnecting")
+        except Exception as e:
+            logger.error(f"Error sending to viewer {self.name}: {str(e)}")
+        finally:
+            self.closed = True
+
+
+class ViewerFanout:
+    """
+    Fan-out tier for visualization viewers.
+
+    Each published message is serialized once into a Frame and handed to every
+    viewer's sender task, so one slow or dead viewer never delays the others.
+    The most recent state frame is kept for new viewers and HTTP snapshots.
+    """
+
+    def __init__(self):
+        self.viewers = set()
+        self.latest_state = None
+        self.viewer_count = 0
+
+    def __len__(self):
+        return len(self.viewers)
+
+    def publish_state(self, state):
+        """Serialize a state snapshot once and offer it to every viewer"""
+        frame = Frame('state', state)
+        self.latest_state = frame
+        self._publish(frame)
+        return frame
+
+    def publish_command(self, data):
+        """Serialize a single command event once and offer it to every viewer"""
+        self._publish(Frame('command', data))
+
+    def _publish(self, frame):
+        for viewer in list(self.viewers):
+            viewer.offer(frame)
+
+    def add(self, send, encode, name=None):
+        """
+        Register a viewer and start its sender task.
+
+        Args:
+            send: coroutine function taking the encoded frame
+            encode: function turning a Frame into what `send` expects
+            name: label used in log messages
+
+        Returns:
+            Viewer: the registered viewer; its `task` finishes when delivery stops
+        """
+        self.viewer_count += 1
+        viewer = Viewer(send, encode, name or f"#{self.viewer_count}")
+        if self.latest_state is not None:
+            viewer.offer(self.latest_state)
+        self.viewers.add(viewer)
+        viewer.task = asyncio.create_task(viewer.run())
+        viewer.task.add_done_callback(lambda _: self.viewers.discard(viewer))
+        return viewer
+
+    def remove(self, viewer):
+        """Stop delivering to a viewer and unregister it"""
+        viewer.close()
+        self.viewers.discard(viewer)
+
+    def close_all(self):
+        """Stop delivering to every viewer"""
+        for viewer in list(self.viewers):
+            viewer.close()